@@ -1,95 +1,426 @@
 import os
+import sys
 import asyncio
-import docker
+import functools
+import json
+import re
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, field
+import aiodocker
+import aiohttp
+import orjson
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Пауза перед переподключением к потокам Docker: растет от минимальной до максимальной
+STATS_RETRY_MIN_DELAY = 1
+STATS_RETRY_MAX_DELAY = 30
+
+# Сколько секунд держать простаивающее соединение с Docker открытым
+DOCKER_KEEPALIVE_TIMEOUT = 120
+
+# Значок статуса контейнера и значок кнопки в списке (действие, которое будет предложено)
+_STATUS_EMOJI = {
+    'running': "🟢",
+    'exited': "🔴",
+    'dead': "🔴",
+    'paused': "⏸️",
+    'restarting': "🔄",
+    'created': "⚪",
+}
+_ACTION_EMOJI = {
+    'running': "⏹️",
+}
+
+# События Docker, после которых сохраненный статус контейнера устаревает
+_STATE_EVENTS = {'start', 'die', 'pause', 'unpause', 'destroy'}
+
+_CONTAINERS_HEADER = "📋 *Список контейнеров:*\n\n"
+_STATS_HEADER = "📊 *Статистика сервера:*\n\n"
+
+_CONTAINER_PREFIX = "container_"
+_ACTION_PREFIX = "action_"
+# Разбор callback_data одним совпадением: вид кнопки и остаток (имя контейнера или "действие_имя")
+_CALLBACK_RE = re.compile(r'^(?P<kind>list|stats|back|container|action)(?:_(?P<rest>.*))?$')
+
+@dataclass(slots=True)
+class StatsSample:
+    """Поля stats-замера, которые нужны боту"""
+    cpu_total: int = 0
+    cpu_system: int = 0
+    online_cpus: int = 0
+    memory_usage: int = 0
+    memory_limit: int = 0
+
+@dataclass(slots=True)
+class ContainerSnapshot:
+    """Снимок контейнеров: каждое поле — отдельный список, а не словарь на каждый контейнер"""
+    names: list[str] = field(default_factory=list)
+    statuses: list[str] = field(default_factory=list)
+    images: list[str] = field(default_factory=list)
+    
+    def __len__(self):
+        return len(self.names)
+
+def _parse_stats_sample(data):
+    """Разобрать JSON stats-замера и оставить только нужные поля"""
+    stats = orjson.loads(data)
+    cpu_stats = stats.get('cpu_stats') or {}
+    cpu_usage = cpu_stats.get('cpu_usage') or {}
+    memory_stats = stats.get('memory_stats') or {}
+    return StatsSample(
+        cpu_total=cpu_usage.get('total_usage', 0),
+        cpu_system=cpu_stats.get('system_cpu_usage', 0),
+        online_cpus=cpu_stats.get('online_cpus') or len(cpu_usage.get('percpu_usage') or ()),
+        memory_usage=memory_stats.get('usage', 0),
+        memory_limit=memory_stats.get('limit', 0)
+    )
+
+def async_ttl_cache(ttl):
+    """Кэшировать результат корутины на ttl секунд.
+    
+    Одновременные вызовы с теми же аргументами ждут уже выполняющийся запрос, а не запускают свой.
+    """
+    def decorator(func):
+        cache = {}
+        locks = {}
+        
+        @functools.wraps(func)
+        async def wrapper(*args):
+            entry = cache.get(args)
+            if entry and entry[1] > time.monotonic():
+                return entry[0]
+            
+            lock = locks.get(args)
+            if lock is None:
+                lock = locks[args] = asyncio.Lock()
+            async with lock:
+                # Пока ждали блокировку, результат мог положить другой вызов
+                entry = cache.get(args)
+                if entry and entry[1] > time.monotonic():
+                    return entry[0]
+                # Если вызов завершился исключением, ничего не кэшируем: следующий вызов повторит запрос
+                value = await func(*args)
+                cache[args] = (value, time.monotonic() + ttl)
+                return value
+        
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
 class DockerBot:
     def __init__(self):
         self.bot_token = os.getenv('BOT_TOKEN')
         # Опционально: ограничить доступ определенным пользователям
         # self.allowed_users = [int(user_id) for user_id in os.getenv('ALLOWED_USERS', '').split(',') if user_id]
-        # Настройка Docker клиента для работы с socket
-        try:
-            # Проверяем доступность socket
-            if not os.path.exists('/var/run/docker.sock'):
-                raise Exception("Docker socket не найден: /var/run/docker.sock")
-            
-            # Используем прямой путь к socket
-            self.docker_client = docker.DockerClient(base_url='unix:///var/run/docker.sock')
-            # Проверяем подключение к Docker
-            self.docker_client.ping()
-            print("Docker подключение успешно установлено")
-        except Exception as e:
-            print(f"Ошибка подключения к Docker: {e}")
-            print("Убедитесь, что Docker socket смонтирован в контейнер")
-            raise
+        # По умолчанию работаем через локальный socket; DOCKER_HOST позволяет указать удаленный демон
+        self.docker_host = os.getenv('DOCKER_HOST', 'unix:///var/run/docker.sock')
+        # Асинхронный клиент создается в post_init, внутри event loop бота
+        self.docker = None
         
+        # Кэш статистики: по одному постоянному stats-потоку на запущенный контейнер
+        self._stats_cache: dict[str, StatsSample] = {}
+        self._stats_tasks: dict[str, asyncio.Task] = {}
+        # Предыдущий замер CPU по контейнерам: (total_usage, system_cpu_usage, time.monotonic())
+        self._prev_cpu: dict[str, tuple[int, int, float]] = {}
+        # Последний вычисленный процент CPU: отдаем его, пока не пришел новый замер
+        self._cpu_percent: dict[str, float] = {}
+        self._events_task = None
+        # Последний показанный список контейнеров и позиции в нем по имени:
+        # экран контейнера строится из него без запроса к Docker
+        self._containers = ContainerSnapshot()
+        self._container_index: dict[str, int] = {}
+        # Обрабатываемое нажатие кнопки по пользователю
+        self._pending: dict[int, asyncio.Task] = {}
+        # Обработчик для каждого вида кнопки из _CALLBACK_RE
+        self._handlers = {
+            'list': lambda query, rest: self.show_containers(query),
+            'stats': lambda query, rest: self.show_stats(query),
+            'back': lambda query, rest: self.start_menu(query),
+            'container': self.show_container_info,
+            'action': self.handle_action,
+        }
+        
+        # Главное меню не меняется: собираем разметку один раз и переиспользуем
+        self._main_text = "🐳 *Docker Bot*\n\nВыберите действие:"
+        self._main_markup = InlineKeyboardMarkup([
+            [InlineKeyboardButton("📋 Список контейнеров", callback_data="list")],
+            [InlineKeyboardButton("📊 Статистика", callback_data="stats")]
+        ])
+        self._back_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="back")]])
+        
+    @async_ttl_cache(ttl=2)
     async def get_containers(self):
-        """Получить список контейнеров"""
-        try:
-            containers = self.docker_client.containers.list(all=True)
-            result = []
-            for container in containers:
-                result.append({
-                    'name': container.name,
-                    'status': container.status,
-                    'image': container.image.tags[0] if container.image.tags else container.image.short_id
-                })
-            return result
-        except Exception as e:
-            print(f"Ошибка при получении контейнеров: {e}")
-            return []
+        """Получить список контейнеров (ошибки Docker пробрасываются и не кэшируются)"""
+        # Список уже содержит образ: не нужен отдельный запрос на каждый контейнер
+        containers = await self.docker.containers.list(all=True)
+        return ContainerSnapshot(
+            names=[c['Names'][0].lstrip('/') for c in containers],
+            statuses=[c['State'] for c in containers],
+            # Обычно много контейнеров запущено из одного образа: храним одну копию строки на образ
+            images=[sys.intern(c['Image']) for c in containers]
+        )
     
-    async def get_container_stats(self):
-        """Получить статистику контейнеров"""
+    async def get_container_stats(self, containers=None):
+        """Получить статистику контейнеров: (текст, запущено, всего)"""
+        # Список для подсчета можно передать уже полученным, чтобы не запрашивать его повторно.
+        # Ошибку получения списка пробрасываем: ее показывает вызывающий код
+        if containers is None:
+            containers = await self.get_containers()
+        running = containers.statuses.count('running')
+        total = len(containers)
+        
         try:
-            containers = self.docker_client.containers.list()
-            if not containers:
-                return "Нет запущенных контейнеров"
+            # Данные уже собраны фоновыми stats-потоками, к Docker не обращаемся
+            if not self._stats_cache:
+                return "Нет запущенных контейнеров", running, total
             
-            stats_text = ""
-            for container in containers:
-                stats = container.stats(stream=False)
-                cpu_percent = self._calculate_cpu_percent(stats)
-                memory_percent = self._calculate_memory_percent(stats)
-                
-                stats_text += f"🟢 {container.name}\n"
-                stats_text += f"   CPU: {cpu_percent:.1f}%\n"
-                stats_text += f"   Память: {memory_percent:.1f}%\n\n"
+            names = list(self._stats_cache)
+            samples = list(self._stats_cache.values())
+            cpu_percents, memory_percents = self._calculate_percents(names, samples)
             
-            return stats_text
+            # Собираем текст списком частей: повторный += копировал бы всю строку на каждой итерации
+            running_emoji = _STATUS_EMOJI['running']
+            stats_text = "".join(
+                f"{running_emoji} {name}\n"
+                f"   CPU: {cpu_percent:.1f}%\n"
+                f"   Память: {memory_percent:.1f}%\n\n"
+                for name, cpu_percent, memory_percent in zip(names, cpu_percents, memory_percents)
+            )
+            return stats_text, running, total
         except Exception as e:
             print(f"Ошибка при получении статистики: {e}")
-            return "Ошибка при получении статистики"
+            return "Ошибка при получении статистики", running, total
     
-    def _calculate_cpu_percent(self, stats):
-        """Вычислить процент использования CPU"""
+    async def _one_shot_stats(self, container):
+        """Получить один замер статистики без ожидания второго цикла сбора на стороне dockerd"""
+        # В aiodocker нет параметра one-shot, поэтому запрос собираем сами и разбираем JSON через orjson
+        async with self.docker._query(
+            f"containers/{container.id}/stats", params={'stream': '0', 'one-shot': '1'}
+        ) as response:
+            return _parse_stats_sample(await response.read())
+    
+    async def _stats_samples(self, container):
+        """Поток замеров статистики контейнера"""
+        # Каждая строка потока — отдельный JSON-документ; orjson разбирает его прямо из байтов, без decode,
+        # и в кэш попадают только нужные числа, а не весь документ
+        # Поток живет столько же, сколько контейнер, поэтому общий таймаут сессии (5 минут) отключаем
+        async with self.docker._query(
+            f"containers/{container.id}/stats", params={'stream': '1'}, timeout=aiohttp.ClientTimeout(total=None)
+        ) as response:
+            async for line in response.content:
+                if line.strip():
+                    yield _parse_stats_sample(line)
+    
+    async def _stream_stats(self, name, container):
+        """Фоновая задача: поддерживать свежую статистику контейнера в кэше"""
         try:
-            cpu_delta = stats['cpu_stats']['cpu_usage']['total_usage'] - stats['precpu_stats']['cpu_usage']['total_usage']
-            system_delta = stats['cpu_stats']['system_cpu_usage'] - stats['precpu_stats']['system_cpu_usage']
-            cpu_percent = (cpu_delta / system_delta) * len(stats['cpu_stats']['cpu_usage']['percpu_usage']) * 100.0
-            return cpu_percent
-        except:
-            return 0.0
+            # Первый замер необязателен: при ошибке просто ждем замеров из потока
+            try:
+                self._stats_cache[name] = await self._one_shot_stats(container)
+            except Exception as e:
+                print(f"Ошибка one-shot статистики {name}: {e}")
+            
+            delay = STATS_RETRY_MIN_DELAY
+            while True:
+                try:
+                    async with aclosing(self._stats_samples(container)) as stream:
+                        async for sample in stream:
+                            self._stats_cache[name] = sample
+                            delay = STATS_RETRY_MIN_DELAY
+                    # Docker закрывает поток, когда контейнер останавливается
+                    break
+                except aiodocker.DockerError as e:
+                    if e.status == 404:
+                        # Контейнер удален: переподключаться некуда
+                        break
+                    print(f"Ошибка stats-потока {name}: {e}, повтор через {delay} с")
+                except Exception as e:
+                    print(f"Ошибка stats-потока {name}: {e}, повтор через {delay} с")
+                # Контейнер еще работает, поэтому не бросаем его, а переподключаемся с растущей паузой
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, STATS_RETRY_MAX_DELAY)
+        finally:
+            self._stats_cache.pop(name, None)
+            if self._stats_tasks.get(name) is asyncio.current_task():
+                del self._stats_tasks[name]
+    
+    def _start_stats_reader(self, name, container):
+        """Запустить stats-поток для контейнера, если он еще не запущен"""
+        task = self._stats_tasks.get(name)
+        if task and not task.done():
+            return
+        self._stats_tasks[name] = asyncio.create_task(self._stream_stats(name, container))
+    
+    def _stop_stats_reader(self, name):
+        """Остановить stats-поток контейнера, чтобы не держать соединение с dockerd"""
+        task = self._stats_tasks.pop(name, None)
+        if task:
+            task.cancel()
+        self._stats_cache.pop(name, None)
+        self._prev_cpu.pop(name, None)
+        self._cpu_percent.pop(name, None)
+    
+    def _subscribe_events(self):
+        """Подписаться на события запуска и остановки контейнеров"""
+        return self.docker.events.subscribe(filters=json.dumps({'type': ['container']}))
+    
+    async def _start_running_readers(self):
+        """Запустить stats-потоки для всех уже запущенных контейнеров"""
+        for container in await self.docker.containers.list():
+            self._start_stats_reader(container['Names'][0].lstrip('/'), container)
+    
+    def _handle_event(self, event):
+        """Обработать событие контейнера"""
+        actor = event.get('Actor') or {}
+        name = (actor.get('Attributes') or {}).get('name')
+        if not name:
+            return
+        if event.get('Action') in _STATE_EVENTS:
+            # Состояние контейнера поменялось, в том числе не через бота: сохраненный список устарел
+            self._container_index.pop(name, None)
+            self.get_containers.cache_clear()
+        if event.get('Action') == 'start':
+            self._start_stats_reader(name, self.docker.containers.container(actor['ID']))
+        elif event.get('Action') == 'die':
+            self._stop_stats_reader(name)
+    
+    async def _watch_events(self, subscriber):
+        """Следить за запуском и остановкой контейнеров, переподписываясь при обрыве потока событий"""
+        delay = STATS_RETRY_MIN_DELAY
+        while True:
+            try:
+                while True:
+                    event = await subscriber.get()
+                    if event is None:
+                        print(f"Поток событий Docker завершен, переподключение через {delay} с")
+                        break
+                    # Подписка работает: следующий обрыв снова начинаем с минимальной паузы
+                    delay = STATS_RETRY_MIN_DELAY
+                    try:
+                        self._handle_event(event)
+                    except Exception as e:
+                        print(f"Ошибка обработки события Docker {event}: {e}")
+            except Exception as e:
+                print(f"Ошибка потока событий Docker: {e}, переподключение через {delay} с")
+            
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STATS_RETRY_MAX_DELAY)
+            try:
+                await self.docker.events.stop()
+            except Exception as e:
+                # stop() пробрасывает ошибку, с которой завершилась прошлая подписка; на новую она не влияет
+                print(f"Предыдущая подписка на события Docker завершилась ошибкой: {e}")
+            # Новая подписка создается всегда: если демон недоступен, она сразу завершится,
+            # и следующая попытка будет после увеличенной паузы
+            subscriber = self._subscribe_events()
+            try:
+                # Пока подписки не было, контейнеры могли запуститься: догоняем их по списку
+                await self._start_running_readers()
+            except Exception as e:
+                print(f"Ошибка получения запущенных контейнеров: {e}")
+    
+    def _create_docker_client(self):
+        """Создать клиент Docker с пулом соединений под долгие stats-потоки"""
+        # Каждый stats-поток держит свое соединение, поэтому общий лимит пула не ставим,
+        # а простаивающие соединения держим дольше стандартных 15 секунд между нажатиями кнопок.
+        # С собственным коннектором aiodocker использует хост из url только для сборки адресов
+        if self.docker_host.startswith('unix://'):
+            connector = aiohttp.UnixConnector(
+                self.docker_host[len('unix://'):], limit=0, keepalive_timeout=DOCKER_KEEPALIVE_TIMEOUT
+            )
+            return aiodocker.Docker(url='unix://localhost', connector=connector)
+        
+        if self.docker_host.startswith('tcp://'):
+            address = self.docker_host[len('tcp://'):]
+            if os.getenv('DOCKER_TLS_VERIFY') == '1':
+                # Тот же SSL-контекст из DOCKER_CERT_PATH, что aiodocker строит для своего коннектора
+                ssl_context = aiodocker.Docker._docker_machine_ssl_context()
+                url = f'https://{address}'
+            else:
+                ssl_context = False
+                url = f'http://{address}'
+            connector = aiohttp.TCPConnector(
+                ssl=ssl_context, limit=0, keepalive_timeout=DOCKER_KEEPALIVE_TIMEOUT
+            )
+            return aiodocker.Docker(url=url, connector=connector)
+        
+        # Прочие схемы (например, npipe://) оставляем со стандартным коннектором aiodocker
+        return aiodocker.Docker(url=self.docker_host)
     
-    def _calculate_memory_percent(self, stats):
-        """Вычислить процент использования памяти"""
+    async def post_init(self, application):
+        """Подключиться к Docker и запустить фоновый сбор статистики вместе с ботом"""
         try:
-            memory_usage = stats['memory_stats']['usage']
-            memory_limit = stats['memory_stats']['limit']
-            return (memory_usage / memory_limit) * 100.0
-        except:
-            return 0.0
+            # Проверяем доступность socket
+            if self.docker_host.startswith('unix://') and not os.path.exists(self.docker_host[len('unix://'):]):
+                raise Exception(f"Docker socket не найден: {self.docker_host[len('unix://'):]}")
+            
+            # Один клиент на всё время работы бота: HTTP-соединения с демоном переиспользуются
+            self.docker = self._create_docker_client()
+            # Проверяем подключение к Docker
+            await self.docker.version()
+            print("Docker подключение успешно установлено")
+        except Exception as e:
+            # С собственным коннектором aiodocker пишет в ошибке unix://localhost, поэтому указываем настоящий адрес
+            print(f"Ошибка подключения к Docker ({self.docker_host}): {e}")
+            print("Убедитесь, что Docker socket смонтирован в контейнер")
+            if self.docker:
+                await self.docker.close()
+            raise
+        
+        # Сначала подписываемся, потом берем список: контейнер, запущенный между ними, не потеряется
+        subscriber = self._subscribe_events()
+        await self._start_running_readers()
+        self._events_task = asyncio.create_task(self._watch_events(subscriber))
+    
+    async def post_shutdown(self, application):
+        """Остановить фоновый сбор статистики и закрыть соединение с Docker"""
+        for name in list(self._stats_tasks):
+            self._stop_stats_reader(name)
+        if self._events_task:
+            self._events_task.cancel()
+        if self.docker:
+            try:
+                await self.docker.events.stop()
+            except Exception as e:
+                # Иначе ошибка последней подписки пробросится из close() и сессия останется открытой
+                print(f"Подписка на события Docker завершилась ошибкой: {e}")
+            await self.docker.close()
+    
+    def _calculate_percents(self, names, samples):
+        """Вычислить проценты CPU и памяти для каждого контейнера"""
+        # Дельту CPU считаем по своему прошлому замеру, а не по precpu_stats от Docker.
+        # Для первого замера контейнера базы еще нет, поэтому 0%
+        now = time.monotonic()
+        cpu_percents = []
+        memory_percents = []
+        for name, sample in zip(names, samples):
+            prev = self._prev_cpu.get(name)
+            if prev is None or sample.cpu_system != prev[1]:
+                # Базу сдвигаем только по новому замеру: иначе повторный просмотр до прихода
+                # следующего замера дал бы нулевую дельту и 0% CPU
+                if prev is not None and sample.cpu_system > prev[1]:
+                    self._cpu_percent[name] = (
+                        (sample.cpu_total - prev[0]) / (sample.cpu_system - prev[1]) * sample.online_cpus * 100.0
+                    )
+                self._prev_cpu[name] = (sample.cpu_total, sample.cpu_system, now)
+            cpu_percents.append(self._cpu_percent.get(name, 0.0))
+            
+            limit = sample.memory_limit
+            memory_percents.append(sample.memory_usage / limit * 100.0 if limit else 0.0)
+        return cpu_percents, memory_percents
     
     async def start_container(self, container_name):
         """Запустить контейнер"""
         try:
-            container = self.docker_client.containers.get(container_name)
-            container.start()
+            container = await self.docker.containers.get(container_name)
+            await container.start()
+            self.get_containers.cache_clear()
+            self._container_index.pop(container_name, None)
             return True
         except Exception as e:
             print(f"Ошибка при запуске контейнера: {e}")
@@ -98,8 +429,10 @@ class DockerBot:
     async def stop_container(self, container_name):
         """Остановить контейнер"""
         try:
-            container = self.docker_client.containers.get(container_name)
-            container.stop()
+            container = await self.docker.containers.get(container_name)
+            await container.stop()
+            self.get_containers.cache_clear()
+            self._container_index.pop(container_name, None)
             return True
         except Exception as e:
             print(f"Ошибка при остановке контейнера: {e}")
@@ -108,18 +441,23 @@ class DockerBot:
     async def restart_container(self, container_name):
         """Перезапустить контейнер"""
         try:
-            container = self.docker_client.containers.get(container_name)
-            container.restart()
+            container = await self.docker.containers.get(container_name)
+            await container.restart()
+            self.get_containers.cache_clear()
+            self._container_index.pop(container_name, None)
             return True
         except Exception as e:
             print(f"Ошибка при перезапуске контейнера: {e}")
             return False
     
-    async def get_container_logs(self, container_name, lines=20):
-        """Получить логи контейнера"""
+    async def get_container_logs(self, container_name, lines=20, max_chars=3000):
+        """Получить логи контейнера (не больше max_chars с конца)"""
         try:
-            container = self.docker_client.containers.get(container_name)
-            logs = container.logs(tail=lines).decode('utf-8')
+            container = await self.docker.containers.get(container_name)
+            # Docker отдает не больше lines строк, поэтому ответ небольшой; обрезаем только по длине сообщения
+            logs = ''.join(await container.log(stdout=True, stderr=True, tail=lines))
+            if len(logs) > max_chars:
+                logs = logs[-max_chars:] + f"\n\n... (показаны последние {lines} строк)"
             return logs
         except Exception as e:
             print(f"Ошибка при получении логов: {e}")
@@ -133,97 +471,95 @@ class DockerBot:
         #     await update.message.reply_text("❌ У вас нет доступа к этому боту.")
         #     return
         
-        keyboard = [
-            [InlineKeyboardButton("📋 Список контейнеров", callback_data="list")],
-            [InlineKeyboardButton("📊 Статистика", callback_data="stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            "🐳 *Docker Bot*\n\nВыберите действие:",
-            reply_markup=reply_markup,
-        )
+        await update.message.reply_text(self._main_text, reply_markup=self._main_markup)
     
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка нажатий на кнопки"""
         query = update.callback_query
-        await query.answer()
         
-        if query.data == "list":
-            await self.show_containers(query)
-        elif query.data == "stats":
-            await self.show_stats(query)
-        elif query.data == "back":
-            await self.start_menu(query)
-        elif query.data.startswith("container_"):
-            await self.show_container_info(query)
-        elif query.data.startswith("action_"):
-            await self.handle_action(query)
+        # Пока предыдущее нажатие пользователя обрабатывается, новые не запускают еще один набор запросов к Docker
+        user_id = query.from_user.id
+        pending = self._pending.get(user_id)
+        if pending and not pending.done():
+            await query.answer("⌛")
+            return
+        
+        await query.answer()
+        # Задача через application: ошибки попадут в обработчики ошибок бота, а следующее нажатие не ждет в очереди
+        task = context.application.create_task(self._dispatch(query), update=update)
+        self._pending[user_id] = task
+        task.add_done_callback(lambda t: self._pending.pop(user_id, None) if self._pending.get(user_id) is t else None)
+    
+    async def _dispatch(self, query):
+        """Выполнить действие, соответствующее нажатой кнопке"""
+        match = _CALLBACK_RE.match(query.data)
+        if match is None:
+            return
+        await self._handlers[match['kind']](query, match['rest'] or "")
     
     async def start_menu(self, query):
         """Показать главное меню"""
-        keyboard = [
-            [InlineKeyboardButton("📋 Список контейнеров", callback_data="list")],
-            [InlineKeyboardButton("📊 Статистика", callback_data="stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            "🐳 *Docker Bot*\n\nВыберите действие:",
-            reply_markup=reply_markup,
-        )
+        await query.edit_message_text(self._main_text, reply_markup=self._main_markup)
     
     async def show_containers(self, query):
         """Показать список контейнеров"""
-        containers = await self.get_containers()
+        try:
+            containers = await self.get_containers()
+        except Exception as e:
+            # Сохраненный список не трогаем: временная ошибка не должна его обнулять
+            print(f"Ошибка при получении контейнеров: {e}")
+            await query.edit_message_text(f"❌ Ошибка при получении контейнеров: {e}", reply_markup=self._back_markup)
+            return
+        self._containers = containers
+        self._container_index = {name: i for i, name in enumerate(containers.names)}
         
         if not containers:
             await query.edit_message_text("📋 Контейнеры не найдены")
             return
         
-        message = "📋 *Список контейнеров:*\n\n"
+        parts = [_CONTAINERS_HEADER]
         keyboard = []
         
-        for container in containers:
-            status_emoji = "🟢" if container['status'] == 'running' else "🔴"
-            
-            message += f"{status_emoji} `{container['name']}`\n"
-            message += f"   Статус: {container['status']}\n"
-            message += f"   Образ: {container['image']}\n\n"
+        for name, status, image in zip(containers.names, containers.statuses, containers.images):
+            parts.append(
+                f"{_STATUS_EMOJI.get(status, '⚪')} `{name}`\n"
+                f"   Статус: {status}\n"
+                f"   Образ: {image}\n\n"
+            )
             
             keyboard.append([
                 InlineKeyboardButton(
-                    f"{'⏹️' if container['status'] == 'running' else '▶️'} {container['name']}",
-                    callback_data=f"container_{container['name']}"
+                    f"{_ACTION_EMOJI.get(status, '▶️')} {name}",
+                    callback_data=f"{_CONTAINER_PREFIX}{name}"
                 )
             ])
         
         keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back")])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.edit_message_text(message, reply_markup=reply_markup)
+        await query.edit_message_text("".join(parts), reply_markup=reply_markup)
     
-    async def show_container_info(self, query):
+    async def show_container_info(self, query, container_name):
         """Показать информацию о контейнере"""
-        container_name = query.data.split("_")[1]
-        
         try:
-            container = self.docker_client.containers.get(container_name)
-            status = container.status
+            i = self._container_index.get(container_name)
+            if i is not None:
+                status, image = self._containers.statuses[i], self._containers.images[i]
+            else:
+                container = await self.docker.containers.get(container_name)
+                status, image = container['State']['Status'], container['Config']['Image']
             
-            message = f"🐳 *{container_name}*\n\n"
-            message += f"Статус: {status}\n"
-            message += f"Образ: {container.image.tags[0] if container.image.tags else container.image.short_id}\n\n"
+            message = f"🐳 *{container_name}*\n\nСтатус: {status}\nОбраз: {image}\n\n"
             
             keyboard = []
             
             if status == 'running':
-                keyboard.append([InlineKeyboardButton("⏹️ Остановить", callback_data=f"action_stop_{container_name}")])
-                keyboard.append([InlineKeyboardButton("🔄 Перезапустить", callback_data=f"action_restart_{container_name}")])
+                keyboard.append([InlineKeyboardButton("⏹️ Остановить", callback_data=f"{_ACTION_PREFIX}stop_{container_name}")])
+                keyboard.append([InlineKeyboardButton("🔄 Перезапустить", callback_data=f"{_ACTION_PREFIX}restart_{container_name}")])
             else:
-                keyboard.append([InlineKeyboardButton("▶️ Запустить", callback_data=f"action_start_{container_name}")])
+                keyboard.append([InlineKeyboardButton("▶️ Запустить", callback_data=f"{_ACTION_PREFIX}start_{container_name}")])
             
-            keyboard.append([InlineKeyboardButton("📝 Логи", callback_data=f"action_logs_{container_name}")])
+            keyboard.append([InlineKeyboardButton("📝 Логи", callback_data=f"{_ACTION_PREFIX}logs_{container_name}")])
             keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="list")])
             
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -231,11 +567,10 @@ class DockerBot:
         except Exception as e:
             await query.edit_message_text(f"❌ Ошибка при получении информации о контейнере: {e}")
     
-    async def handle_action(self, query):
+    async def handle_action(self, query, data):
         """Обработка действий с контейнерами"""
-        data = query.data.split("_")
-        action = data[1]
-        container_name = "_".join(data[2:])
+        # Имя контейнера может содержать "_", поэтому отделяем только действие
+        action, _, container_name = data.partition("_")
         
         if action == "start":
             success = await self.start_container(container_name)
@@ -257,36 +592,34 @@ class DockerBot:
                 await query.edit_message_text(f"❌ Ошибка при перезапуске контейнера {container_name}")
         elif action == "logs":
             logs = await self.get_container_logs(container_name, 20)
-            if len(logs) > 3000:
-                logs = logs[-3000:] + "\n\n... (показаны последние 20 строк)"
-            
             message = f"📝 *Логи {container_name}:*\n\n```\n{logs}\n```"
-            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=f"container_{container_name}")]]
+            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=f"{_CONTAINER_PREFIX}{container_name}")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             await query.edit_message_text(message, reply_markup=reply_markup)
     
     async def show_stats(self, query):
         """Показать статистику"""
-        stats_text = await self.get_container_stats()
-        
-        # Подсчет контейнеров
-        containers = await self.get_containers()
-        total_containers = len(containers)
-        running_containers = len([c for c in containers if c['status'] == 'running'])
-        
-        message = "📊 *Статистика сервера:*\n\n"
-        message += f"🌐 Контейнеры: {running_containers}/{total_containers}\n\n"
-        message += stats_text
+        try:
+            stats_text, running_containers, total_containers = await self.get_container_stats()
+        except Exception as e:
+            print(f"Ошибка при получении контейнеров: {e}")
+            await query.edit_message_text(f"❌ Ошибка при получении статистики: {e}", reply_markup=self._back_markup)
+            return
         
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        message = "".join((_STATS_HEADER, f"🌐 Контейнеры: {running_containers}/{total_containers}\n\n", stats_text))
         
-        await query.edit_message_text(message, reply_markup=reply_markup)
+        await query.edit_message_text(message, reply_markup=self._back_markup)
     
     def run(self):
         """Запуск бота"""
-        application = Application.builder().token(self.bot_token).build()
+        application = (
+            Application.builder()
+            .token(self.bot_token)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
         
         application.add_handler(CommandHandler("start", self.start))
         application.add_handler(CallbackQueryHandler(self.button_handler))
@@ -295,5 +628,9 @@ class DockerBot:
         application.run_polling()
 
 if __name__ == "__main__":
+    # Event loop на libuv: быстрее стандартного asyncio при той же логике бота
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    
     bot = DockerBot()
     bot.run()